@@ -83,7 +83,10 @@ class TorchParam(ProxyParam):
         return self.param.data.detach().cpu().numpy()
 
     def set_data(self, np_value):
-        self.param.data = torch.as_tensor(np_value).type(self.param.dtype).to(self.param.device)
+        # as_tensor wraps the numpy buffer without a copy, copy_ then casts and moves it
+        # straight into the existing storage, keeping the param's memory format
+        with torch.no_grad():
+            self.param.copy_(torch.as_tensor(np_value))
 
     def shape(self):
         return list(self.param.shape)
@@ -22,7 +22,7 @@ from tools.infer_cls import build_cls_process
 
 
 
-def to_onnx(model, dummy_input, dynamic_axes, sava_path="model.onnx"):
+def to_onnx(model, dummy_input, dynamic_axes, sava_path="model.onnx", opset_version=None):
     input_axis_name = ['batch_size', 'channel', 'in_width', 'int_height']
     output_axis_name = ['batch_size', 'channel', 'out_width', 'out_height']
     torch.onnx.export(
@@ -35,8 +35,46 @@ def to_onnx(model, dummy_input, dynamic_axes, sava_path="model.onnx"):
             "input": {axis: input_axis_name[axis] for axis in dynamic_axes},
             "output": {axis: output_axis_name[axis] for axis in dynamic_axes},
         },
+        opset_version=opset_version,
     )
 
+
+def to_trt(onnx_path, export_config, save_path="model.engine"):
+    import tensorrt as trt
+
+    trt_logger = trt.Logger(trt.Logger.WARNING)
+    builder = trt.Builder(trt_logger)
+    # explicit batch is the only mode (and the flag deprecated) from tensorrt 10
+    explicit_batch = getattr(trt.NetworkDefinitionCreationFlag, 'EXPLICIT_BATCH', None)
+    network = builder.create_network(0 if explicit_batch is None else 1 << int(explicit_batch))
+    parser = trt.OnnxParser(network, trt_logger)
+    with open(onnx_path, 'rb') as f:
+        if not parser.parse(f.read()):
+            errors = [str(parser.get_error(i)) for i in range(parser.num_errors)]
+            raise RuntimeError(f"failed to parse {onnx_path}: {errors}")
+
+    builder_config = builder.create_builder_config()
+    if getattr(builder, 'platform_has_fast_fp16', True):
+        builder_config.set_flag(trt.BuilderFlag.FP16)
+    shape = export_config['export_shape']
+    if export_config.get('dynamic_axes'):
+        # without a range the engine would only accept exactly export_shape
+        if 'trt_min_shape' not in export_config or 'trt_max_shape' not in export_config:
+            raise ValueError("Export.dynamic_axes is set, Export.trt_min_shape and "
+                             "Export.trt_max_shape are required to build the tensorrt engine")
+        min_shape, max_shape = export_config['trt_min_shape'], export_config['trt_max_shape']
+    else:
+        min_shape = max_shape = shape
+    profile = builder.create_optimization_profile()
+    profile.set_shape("input", min_shape, shape, max_shape)
+    builder_config.add_optimization_profile(profile)
+
+    engine = builder.build_serialized_network(network, builder_config)
+    if engine is None:
+        raise RuntimeError(f"failed to build tensorrt engine from {onnx_path}")
+    with open(save_path, 'wb') as f:
+        f.write(engine)
+
 def export_single_model(model: torch.nn.Module, _cfg,export_dir,export_config, logger, type):
     for layer in model.modules():
         if hasattr(layer, "rep") and not getattr(layer, "is_repped"):
@@ -58,9 +96,24 @@ def export_single_model(model: torch.nn.Module, _cfg,export_dir,export_config, l
         save_path = os.path.join(export_dir, 'model.pt')
         trace_model = torch.jit.trace(model, dummy_input, strict=False)
         torch.jit.save(trace_model, save_path)
+    elif type == 'mobile':
+        from torch.utils.mobile_optimizer import optimize_for_mobile
+        save_path = os.path.join(export_dir, 'model.ptl')
+        trace_model = torch.jit.trace(model, dummy_input, strict=False)
+        # fuses conv/bn/hardswish and prepacks conv weights for xnnpack
+        mobile_model = optimize_for_mobile(trace_model)
+        mobile_model._save_for_lite_interpreter(save_path)
     elif type == 'onnx':
         save_path = os.path.join(export_dir, 'model.onnx')
-        to_onnx(model, dummy_input, export_config.get('dynamic_axes', []), save_path)
+        to_onnx(model, dummy_input, export_config.get('dynamic_axes', []), save_path,
+                export_config.get('opset_version'))
+    elif type == 'trt':
+        onnx_path = os.path.join(export_dir, 'model.onnx')
+        # HardSwish is a native onnx op from opset 14, so trt can fuse it with the conv
+        to_onnx(model, dummy_input, export_config.get('dynamic_axes', []), onnx_path,
+                export_config.get('opset_version', 17))
+        save_path = os.path.join(export_dir, 'model.engine')
+        to_trt(onnx_path, export_config, save_path)
     else:
         raise NotImplementedError
     logger.info(f"finish export model to {save_path}")
@@ -97,7 +150,7 @@ def parse_args():
         "--type",
         type=str,
         default='onnx',
-        help="type of export")
+        help="type of export, onnx, script, mobile or trt")
     args = parser.parse_args()
     return args
 
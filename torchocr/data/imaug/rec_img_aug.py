@@ -208,19 +208,24 @@ class RecResizeImg(object):
                  eval_mode=False,
                  character_dict_path='./torchocr/utils/torchocr_keys_v1.txt',
                  padding=True,
+                 width_align=None,
                  **kwargs):
         self.image_shape = image_shape
         self.infer_mode = infer_mode
         self.eval_mode = eval_mode
         self.character_dict_path = character_dict_path
         self.padding = padding
+        # pad the variable eval/infer width up to a multiple of width_align so
+        # inputs fall into a few shape buckets and cudnn's algo cache gets hits
+        self.width_align = width_align
 
     def __call__(self, data):
         img = data['image']
         if self.eval_mode or (self.infer_mode and
                               self.character_dict_path is not None):
             norm_img, valid_ratio = resize_norm_img_chinese(img,
-                                                            self.image_shape)
+                                                            self.image_shape,
+                                                            self.width_align)
         else:
             norm_img, valid_ratio = resize_norm_img(img, self.image_shape,
                                                     self.padding)
@@ -555,7 +560,7 @@ def resize_norm_img(img,
     return padding_im, valid_ratio
 
 
-def resize_norm_img_chinese(img, image_shape):
+def resize_norm_img_chinese(img, image_shape, width_align=None):
     imgC, imgH, imgW = image_shape
     max_wh_ratio = imgW * 1.0 / imgH
     h, w = img.shape[0], img.shape[1]
@@ -566,6 +571,8 @@ def resize_norm_img_chinese(img, image_shape):
         resized_w = imgW
     else:
         resized_w = int(math.ceil(imgH * ratio))
+    if width_align:
+        imgW = int(math.ceil(imgW / width_align) * width_align)
     resized_image = cv2.resize(img, (resized_w, imgH))
     resized_image = resized_image.astype('float32')
     if image_shape[0] == 1:
@@ -107,6 +107,9 @@ class Trainer(object):
 
         # amp
         self.scaler = torch.cuda.amp.GradScaler() if self.cfg['Global'].get('use_amp', False) else None
+        # tf32 matmuls, opt-in since it changes the numerics of lstm/attention heads
+        if self.device.type == 'cuda' and self.cfg['Global'].get('use_tf32', False):
+            torch.backends.cuda.matmul.allow_tf32 = True
 
         self.logger.info(f'run with torch {torch.__version__} and device {self.device}')
 
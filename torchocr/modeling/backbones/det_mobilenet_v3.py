@@ -1,4 +1,6 @@
+import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torchocr.modeling.common import Activation
 
 def make_divisible(v, divisor=8, min_value=None):
@@ -36,6 +38,7 @@ class ConvBNLayer(nn.Module):
             )
         if self.if_act:
             self.act = Activation(act_type=act, inplace=True)
+        self.is_repped = False
 
     def forward(self, x):
         x = self.conv(x)
@@ -44,6 +47,26 @@ class ConvBNLayer(nn.Module):
             x = self.act(x)
         return x
 
+    def rep(self):
+        # fold bn into conv for inference, bn becomes a no-op
+        if self.is_repped:
+            return
+        std = (self.bn.running_var + self.bn.eps).sqrt()
+        t = (self.bn.weight / std).reshape((-1, 1, 1, 1))
+        conv = nn.Conv2d(
+            in_channels=self.conv.in_channels,
+            out_channels=self.conv.out_channels,
+            kernel_size=self.conv.kernel_size,
+            stride=self.conv.stride,
+            padding=self.conv.padding,
+            groups=self.conv.groups,
+            bias=True)
+        conv.weight.data = self.conv.weight * t
+        conv.bias.data = self.bn.bias - self.bn.running_mean * self.bn.weight / std
+        self.conv = conv
+        self.bn = nn.Identity()
+        self.is_repped = True
+
 
 class SEModule(nn.Module):
     def __init__(self, in_channels, reduction=4, name=""):
@@ -67,12 +90,14 @@ class SEModule(nn.Module):
         self.hard_sigmoid = Activation(act_type='hard_sigmoid', inplace=True)
 
     def forward(self, inputs):
-        outputs = self.avg_pool(inputs)
-        outputs = self.conv1(outputs)
+        # the 1x1 convs see a 1x1 map, so run them as plain gemms on (N, C);
+        # the conv params are kept so checkpoints and paddle weights still map
+        outputs = self.avg_pool(inputs).flatten(1)
+        outputs = F.linear(outputs, self.conv1.weight.flatten(1), self.conv1.bias)
         outputs = self.relu1(outputs)
-        outputs = self.conv2(outputs)
+        outputs = F.linear(outputs, self.conv2.weight.flatten(1), self.conv2.bias)
         outputs = self.hard_sigmoid(outputs)
-        outputs = inputs * outputs
+        outputs = inputs * outputs[:, :, None, None]
         return outputs
 
 
@@ -87,7 +112,9 @@ class ResidualUnit(nn.Module):
                  act=None,
                  name=''):
         super(ResidualUnit, self).__init__()
-        self.if_shortcut = stride == 1 and in_channels == out_channels
+        self.use_residual = stride == 1 and in_channels == out_channels
+        # fx quantization only matches the out-of-place add
+        self.inplace_add = True
         self.if_se = use_se
 
         self.expand_conv = ConvBNLayer(
@@ -124,8 +151,12 @@ class ResidualUnit(nn.Module):
         if self.if_se:
             x = self.mid_se(x)
         x = self.linear_conv(x)
-        if self.if_shortcut:
-            x = inputs + x
+        if self.use_residual:
+            if self.inplace_add:
+                # x is the fresh output of linear_conv, safe to accumulate into
+                x.add_(inputs)
+            else:
+                x = inputs + x
         return x
 
 
@@ -143,8 +174,6 @@ class MobileNetV3(nn.Module):
         """
         super(MobileNetV3, self).__init__()
 
-        self.disable_se = disable_se
-
         if model_name == "large":
             cfg = [
                 # k, exp, c,  se,     nl,  s,
@@ -206,7 +235,7 @@ class MobileNetV3(nn.Module):
         i = 0
         inplanes = make_divisible(inplanes * scale)
         for (k, exp, c, se, nl, s) in cfg:
-            se = se and not self.disable_se
+            se = se and not disable_se
             if s == 2 and i > 2:
                 self.out_channels.append(inplanes)
                 self.stages.append(nn.Sequential(*block_list))
@@ -237,8 +266,12 @@ class MobileNetV3(nn.Module):
         self.out_channels.append(make_divisible(scale * cls_ch_squeeze))
         # for i, stage in enumerate(self.stages):
         #     self.add_sublayer(sublayer=stage, name="stage{}".format(i))
+        # depthwise convs are much faster on NHWC input, every op in the
+        # blocks keeps the layout so only the input needs converting
+        self.to(memory_format=torch.channels_last)
 
     def forward(self, x):
+        x = x.contiguous(memory_format=torch.channels_last)
         x = self.conv(x)
         out_list = []
         for stage in self.stages:
@@ -160,7 +160,7 @@ class BottleneckBlock(nn.Module):
         else:
             short = self.short(inputs)
         y = torch.add(short, conv2)
-        y = F.relu(y)
+        y = F.relu(y, inplace=True)
         return y
 
 
@@ -204,7 +204,7 @@ class BasicBlock(nn.Module):
         else:
             short = self.short(inputs)
         y = short + conv1
-        y = F.relu(y)
+        y = F.relu(y, inplace=True)
         return y
 
 
@@ -1,14 +1,22 @@
+import contextlib
+import copy
+
+import torch
 import torch.nn as nn
 
 from .det_mobilenet_v3 import ResidualUnit, ConvBNLayer, make_divisible
 
 class MobileNetV3(nn.Module):
+    # (model_name, scale) -> (stem channels, [(mid, out) per block], last channels)
+    _channel_table = {}
+
     def __init__(self,
                  in_channels=3,
                  model_name='small',
                  scale=0.5,
                  large_stride=None,
                  small_stride=None,
+                 amp_dtype=None,
                  **kwargs):
         super(MobileNetV3, self).__init__()
         if small_stride is None:
@@ -69,11 +77,12 @@ class MobileNetV3(nn.Module):
         assert scale in supported_scale, \
             "supported scales are {} but input scale is {}".format(supported_scale, scale)
 
-        inplanes = 16
+        stem_channels, block_channels, last_channels = self._get_channels(
+            model_name, scale, cfg, cls_ch_squeeze)
         # conv1
         self.conv1 = ConvBNLayer(
             in_channels=in_channels,
-            out_channels=make_divisible(inplanes * scale),
+            out_channels=stem_channels,
             kernel_size=3,
             stride=2,
             padding=1,
@@ -82,25 +91,25 @@ class MobileNetV3(nn.Module):
             act='hard_swish')
         i = 0
         block_list = []
-        inplanes = make_divisible(inplanes * scale)
-        for (k, exp, c, se, nl, s) in cfg:
+        inplanes = stem_channels
+        for (k, exp, c, se, nl, s), (mid_c, out_c) in zip(cfg, block_channels):
             block_list.append(
                 ResidualUnit(
                     in_channels=inplanes,
-                    mid_channels=make_divisible(scale * exp),
-                    out_channels=make_divisible(scale * c),
+                    mid_channels=mid_c,
+                    out_channels=out_c,
                     kernel_size=k,
                     stride=s,
                     use_se=se,
                     act=nl,
                     name='conv' + str(i + 2)))
-            inplanes = make_divisible(scale * c)
+            inplanes = out_c
             i += 1
         self.blocks = nn.Sequential(*block_list)
 
         self.conv2 = ConvBNLayer(
             in_channels=inplanes,
-            out_channels=make_divisible(scale * cls_ch_squeeze),
+            out_channels=last_channels,
             kernel_size=1,
             stride=1,
             padding=0,
@@ -109,11 +118,105 @@ class MobileNetV3(nn.Module):
             act='hard_swish')
 
         self.pool = nn.MaxPool2d(kernel_size=2, stride=2, padding=0)
-        self.out_channels = make_divisible(scale * cls_ch_squeeze)
-
-    def forward(self, x):
-        x = self.conv1(x)
-        x = self.blocks(x)
-        x = self.conv2(x)
-        x = self.pool(x)
-        return x
\ No newline at end of file
+        self.out_channels = last_channels
+        # NHWC lets cudnn pick tensor-core kernels for the 1x1/depthwise convs
+        # without inserting a layout transpose around every conv
+        self.to(memory_format=torch.channels_last)
+        # run the forward under cuda autocast, e.g. 'float16' or 'bfloat16'
+        self.amp_dtype = getattr(torch, amp_dtype) if isinstance(amp_dtype, str) else amp_dtype
+        self._graph = None
+        self._static_in = None
+        self._static_out = None
+
+    @classmethod
+    def _get_channels(cls, model_name, scale, cfg, cls_ch_squeeze):
+        # channel widths only depend on model_name and scale, strides do not matter
+        key = (model_name, scale)
+        if key not in cls._channel_table:
+            cls._channel_table[key] = (
+                make_divisible(16 * scale),
+                [(make_divisible(scale * exp), make_divisible(scale * c))
+                 for (_, exp, c, _, _, _) in cfg],
+                make_divisible(scale * cls_ch_squeeze))
+        return cls._channel_table[key]
+
+    def forward(self, x, cache_enabled=True):
+        dtype = x.dtype
+        # only open our own autocast when asked to, a disabled one would switch off
+        # the trainer's use_amp autocast around the whole model
+        amp_ctx = torch.autocast('cuda', dtype=self.amp_dtype, cache_enabled=cache_enabled) \
+            if self.amp_dtype is not None else contextlib.nullcontext()
+        with amp_ctx:
+            x = x.contiguous(memory_format=torch.channels_last)
+            x = self.conv1(x)
+            x = self.blocks(x)
+            x = self.conv2(x)
+            x = self.pool(x)
+        if self.amp_dtype is not None:
+            # hand the neck the dtype it was called with
+            x = x.to(dtype)
+        return x
+
+    @torch.inference_mode()
+    def forward_graph(self, x):
+        """
+        inference only forward that replays a captured cuda graph, the graph is
+        captured on the first call and recaptured whenever the input shape, dtype
+        or device changes
+        """
+        assert not self.training, "forward_graph only supports eval mode"
+        if self._graph is None or self._static_in.shape != x.shape \
+                or self._static_in.dtype != x.dtype or self._static_in.device != x.device:
+            self._static_in = x.clone(memory_format=torch.channels_last)
+            # warm up on a side stream so cudnn workspaces exist before capture
+            s = torch.cuda.Stream()
+            s.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(s):
+                self.forward(self._static_in, cache_enabled=False)
+            torch.cuda.current_stream().wait_stream(s)
+            self._graph = torch.cuda.CUDAGraph()
+            # the autocast weight cast cache is freed on exit, so it must be off
+            # while capturing
+            with torch.cuda.graph(self._graph):
+                self._static_out = self.forward(self._static_in, cache_enabled=False)
+        self._static_in.copy_(x)
+        self._graph.replay()
+        return self._static_out.clone()
+
+    def quantize(self, calib_loader, backend='fbgemm'):
+        """
+        post training static int8 quantization, returns a quantized copy of the backbone
+        Args:
+            calib_loader: iterable of images or of batches whose first item is the images
+            backend: 'fbgemm' for x86 or 'qnnpack' for arm
+        """
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        # the cuda graph left by forward_graph and its static buffers can not be
+        # deep copied and are of no use to the quantized model
+        memo = {id(v): None for v in (self._graph, self._static_in, self._static_out) if v is not None}
+        model = copy.deepcopy(self, memo).cpu().eval()
+        model.amp_dtype = None
+        for m in model.modules():
+            if isinstance(m, ResidualUnit):
+                m.inplace_add = False
+
+        old_engine = torch.backends.quantized.engine
+        torch.backends.quantized.engine = backend
+        try:
+            prepared = None
+            with torch.no_grad():
+                for batch in calib_loader:
+                    x = batch[0] if isinstance(batch, (list, tuple)) else batch
+                    x = x.cpu()
+                    if prepared is None:
+                        # fx mode fuses conv+bn(+relu) and handles the functional
+                        # add/mul itself, so the forward path needs no quant stubs
+                        prepared = prepare_fx(model, get_default_qconfig_mapping(backend), example_inputs=(x,))
+                    prepared(x)
+            if prepared is None:
+                raise ValueError("calib_loader yielded no batches, can not calibrate")
+            return convert_fx(prepared)
+        finally:
+            torch.backends.quantized.engine = old_engine
@@ -197,9 +197,6 @@ class MobileNetV1Enhance(nn.Module):
         y = self.pool(y)
         return y
 
-def hardsigmoid(x):
-    return F.relu6(x + 3., inplace=True) / 6.
-
 class SEModule(nn.Module):
     def __init__(self, channel, reduction=4):
         super(SEModule, self).__init__()
@@ -218,13 +215,14 @@ class SEModule(nn.Module):
             stride=1,
             padding=0,
             bias=True)
+        self.hard_sigmoid = Activation(act_type='hard_sigmoid', inplace=True)
 
     def forward(self, inputs):
         outputs = self.avg_pool(inputs)
         outputs = self.conv1(outputs)
         outputs = F.relu(outputs)
         outputs = self.conv2(outputs)
-        outputs = hardsigmoid(outputs)
+        outputs = self.hard_sigmoid(outputs)
         x = torch.mul(inputs, outputs)
 
         return x
@@ -1,5 +1,9 @@
+import contextlib
+
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.modules.utils import _pair
 
 from torchocr.modeling.common import Activation
 
@@ -33,6 +37,7 @@ class ConvBNLayer(nn.Module):
             out_channels, )
         if self.act is not None:
             self._act = Activation(act_type=act, inplace=True)
+        self.is_repped = False
 
     def forward(self, inputs):
         if self.is_vd_mode:
@@ -43,6 +48,39 @@ class ConvBNLayer(nn.Module):
             y = self._act(y)
         return y
 
+    def rep(self):
+        # fold bn into conv for inference, bn becomes a no-op
+        if self.is_repped:
+            return
+        bn = self._batch_norm
+        std = (bn.running_var + bn.eps).sqrt()
+        t = (bn.weight / std).reshape((-1, 1, 1, 1))
+        kernel = self._conv.weight * t
+        kernel_size = self._conv.kernel_size
+        stride = self._conv.stride
+        padding = self._conv.padding
+        if self.is_vd_mode and kernel_size == (1, 1):
+            # avg pool + 1x1 conv is one conv with stride equal to the pool window
+            # and the 1x1 weights spread evenly over that window
+            kernel_size = stride = _pair(self._pool2d_avg.kernel_size)
+            padding = (0, 0)
+            kernel = (kernel / (kernel_size[0] * kernel_size[1])).expand(
+                -1, -1, *kernel_size).contiguous()
+            self.is_vd_mode = False
+        conv = nn.Conv2d(
+            in_channels=self._conv.in_channels,
+            out_channels=self._conv.out_channels,
+            kernel_size=kernel_size,
+            stride=stride,
+            padding=padding,
+            groups=self._conv.groups,
+            bias=True)
+        conv.weight.data = kernel
+        conv.bias.data = bn.bias - bn.running_mean * bn.weight / std
+        self._conv = conv
+        self._batch_norm = nn.Identity()
+        self.is_repped = True
+
 
 class BottleneckBlock(nn.Module):
     def __init__(self,
@@ -53,7 +91,7 @@ class BottleneckBlock(nn.Module):
                  if_first=False,
                  name=None):
         super(BottleneckBlock, self).__init__()
-        self.scale = 4
+        scale = 4
         self.conv0 = ConvBNLayer(
             in_channels=in_channels,
             out_channels=out_channels,
@@ -67,20 +105,20 @@ class BottleneckBlock(nn.Module):
             act='relu')
         self.conv2 = ConvBNLayer(
             in_channels=out_channels,
-            out_channels=out_channels * self.scale,
+            out_channels=out_channels * scale,
             kernel_size=1,
             act=None)
 
         if not shortcut:
             self.short = ConvBNLayer(
                 in_channels=in_channels,
-                out_channels=out_channels * self.scale,
+                out_channels=out_channels * scale,
                 kernel_size=1,
                 stride=stride,
                 is_vd_mode=not if_first and stride[0] != 1)
 
         self.shortcut = shortcut
-        self.out_channels = out_channels * self.scale
+        self.out_channels = out_channels * scale
 
     def forward(self, inputs):
         y = self.conv0(inputs)
@@ -93,7 +131,7 @@ class BottleneckBlock(nn.Module):
         else:
             short = self.short(inputs)
         y = short + conv2
-        y = F.relu(y)
+        y = F.relu(y, inplace=True)
         return y
 
 
@@ -106,8 +144,7 @@ class BasicBlock(nn.Module):
                  if_first=False,
                  name=None):
         super(BasicBlock, self).__init__()
-        self.stride = stride
-        self.scale = 1
+        scale = 1
         self.conv0 = ConvBNLayer(
             in_channels=in_channels,
             out_channels=out_channels,
@@ -129,7 +166,7 @@ class BasicBlock(nn.Module):
                 is_vd_mode=not if_first and stride[0] != 1)
 
         self.shortcut = shortcut
-        self.out_channels = out_channels * self.scale
+        self.out_channels = out_channels * scale
 
     def forward(self, inputs):
         y = self.conv0(inputs)
@@ -140,15 +177,14 @@ class BasicBlock(nn.Module):
         else:
             short = self.short(inputs)
         y = short + conv1
-        y = F.relu(y)
+        y = F.relu(y, inplace=True)
         return y
 
 
 class ResNet(nn.Module):
-    def __init__(self, in_channels=3, layers=50, **kwargs):
+    def __init__(self, in_channels=3, layers=50, amp_dtype=None, **kwargs):
         super(ResNet, self).__init__()
 
-        self.layers = layers
         supported_layers = [18, 34, 50, 101, 152, 200]
         assert layers in supported_layers, \
             "supported layers are {} but input layer is {}".format(
@@ -222,14 +258,25 @@ class ResNet(nn.Module):
                 self.block_list.add_module('bb_%d_%d' % (block, i), block_instance)
             self.out_channels = num_filters[block]
         self.out_pool = nn.MaxPool2d(kernel_size=2, stride=2, padding=0)
+        # keep conv weights in NHWC, see MobileNetV3 in rec_mobilenet_v3.py
+        self.to(memory_format=torch.channels_last)
+        # run the forward under cuda autocast, e.g. 'float16' or 'bfloat16'
+        self.amp_dtype = getattr(torch, amp_dtype) if isinstance(amp_dtype, str) else amp_dtype
 
     def forward(self, inputs):
-        y = self.conv1_1(inputs)
-        y = self.conv1_2(y)
-        y = self.conv1_3(y)
-        y = self.pool2d_max(y)
-        for block in self.block_list:
-            y = block(y)
-        y = self.out_pool(y)
-
+        dtype = inputs.dtype
+        # see MobileNetV3.forward in rec_mobilenet_v3.py
+        amp_ctx = torch.autocast('cuda', dtype=self.amp_dtype) \
+            if self.amp_dtype is not None else contextlib.nullcontext()
+        with amp_ctx:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+            y = self.conv1_1(inputs)
+            y = self.conv1_2(y)
+            y = self.conv1_3(y)
+            y = self.pool2d_max(y)
+            for block in self.block_list:
+                y = block(y)
+            y = self.out_pool(y)
+        if self.amp_dtype is not None:
+            y = y.to(dtype)
         return y